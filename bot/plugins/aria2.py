@@ -1,15 +1,31 @@
 import ast
 import asyncio
 import logging
+import os
+import shutil
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from os.path import join
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, ClassVar, Dict, Optional, Set, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ClassVar,
+    DefaultDict,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from urllib import parse
 
+import aiohttp
 from aioaria2 import Aria2WebsocketClient, AsyncAria2Server
 from aioaria2.exceptions import Aria2rpcException
-from aiofile import AIOFile, Reader, Writer
 from aiopath import AsyncPath
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
@@ -23,12 +39,77 @@ from tenacity import (
 )
 
 from bot import command, plugin, util
+from bot.util.file import human_readable_bytes as human
+from bot.util.time import format_duration_td as time
 
 if TYPE_CHECKING:
     from .gdrive import GoogleDrive
     from .mega import Mega
     from ..core import Bot
 
+# Attempts in a row a Drive upload chunk may fail before the upload is dropped
+UPLOAD_RETRIES = 5
+
+# Progress bar for every tenth, padded to the width of a full bar
+_BARS = [("●" * n + "○" + "    " * (9 - n)) if n < 10 else "●" * 10
+         for n in range(11)]
+
+
+def _pwrite_all(fd: int, data: memoryview, offset: int) -> None:
+    # pwrite may write less than asked, there is no ciphertext copy to
+    # redo a chunk from so keep going until all of it is on disk
+    while data:
+        written = os.pwrite(fd, data, offset)
+        if not written:
+            raise OSError(f"pwrite wrote nothing at offset {offset}")
+
+        data = data[written:]
+        offset += written
+
+
+def _decrypt_file(path: str, decrypt: Callable[..., Any],
+                  progress: Optional[Callable[[int], Any]] = None,
+                  bufsize: int = 4 * 1024 * 1024) -> None:
+    # CTR keeps the size, so the file is decrypted in place. Three buffers
+    # rotate so that chunk N+1 is read and chunk N-1 is written back
+    # while chunk N is decrypted
+    views = [memoryview(bytearray(bufsize)) for _ in range(3)]
+    fd = os.open(path, os.O_RDWR)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            index = offset = 0
+            reading = pool.submit(os.preadv, fd, [views[index]], offset)
+            writing = None
+            while True:
+                length = reading.result()
+                if not length:
+                    break
+
+                chunk = views[index][:length]
+                index = (index + 1) % len(views)
+                reading = pool.submit(os.preadv, fd, [views[index]],
+                                      offset + length)
+
+                decrypt(chunk, output=chunk)
+                if writing is not None:
+                    writing.result()
+                writing = pool.submit(_pwrite_all, fd, chunk, offset)
+
+                offset += length
+                if progress is not None:
+                    progress(offset)
+
+            if writing is not None:
+                writing.result()
+
+        # The size never changes, so only the data has to reach the disk
+        getattr(os, "fdatasync", os.fsync)(fd)
+    finally:
+        os.close(fd)
+
 
 class SeedProtocol(asyncio.SubprocessProtocol):
 
@@ -36,10 +117,10 @@ class SeedProtocol(asyncio.SubprocessProtocol):
         self.future = future
         self.log = log
 
-        self.output = bytearray()
+        self.output: List[bytes] = []
 
     def pipe_data_received(self, fd: int, data: bytes):
-        self.output.extend(data)
+        self.output.append(data)
 
     def process_exited(self):
         self.future.set_result(True)
@@ -49,7 +130,7 @@ class Aria2WebSocketServer:
     log: ClassVar[logging.Logger] = logging.getLogger("aria2ws")
 
     bot: "Bot"
-    cancelled: Set[str]
+    client: Aria2WebsocketClient
     downloads: Dict[str, util.aria2.Download]
     lock: asyncio.Lock
     uploads: Dict[str, Any]
@@ -58,23 +139,34 @@ class Aria2WebSocketServer:
     context: command.Context
     stopping: bool
     mega: Set[str]
+    wake: asyncio.Event
 
+    _gid_locks: DefaultDict[str, asyncio.Lock]
+    _meta_lock: asyncio.Lock
+    _upload_chunks: Dict[str, Tuple[Any, Any]]
+    _upload_tasks: Dict[str, asyncio.Task]
     _protocol: str
 
     def __init__(self, bot: "Bot", drive: "GoogleDrive") -> None:
         self.bot = bot
         self.drive = drive
 
+        # lock guards the progress message context, _meta_lock adding and
+        # removing gids and _gid_locks the work done on a single gid
         self.lock = asyncio.Lock()
+        self._gid_locks = defaultdict(asyncio.Lock)
+        self._meta_lock = asyncio.Lock()
 
-        self.cancelled = set()
         self.downloads = {}
         self.uploads = {}
+        self._upload_chunks = {}
+        self._upload_tasks = {}
 
         self.index_link = self.drive.index_link
         self.context = None  # type: ignore
         self.stopping = False
         self.mega = set()
+        self.wake = asyncio.Event()
 
     @classmethod
     async def init(cls, bot: "Bot", drive: "GoogleDrive") -> "Aria2WebSocketServer":
@@ -83,10 +175,34 @@ class Aria2WebSocketServer:
         download_path = self.bot.config["download_path"]
         await download_path.mkdir(parents=True, exist_ok=True)
 
-        link = "https://raw.githubusercontent.com/ngosang/trackerslist/master/trackers_best.txt"
-        async with self.bot.http.get(link) as resp:
-            trackers_list: str = await resp.text()
-            trackers: str = "[" + trackers_list.replace("\n\n", ",") + "]"
+        cache_path = AsyncPath(Path.home() / ".cache" / "bot")
+
+        # Reuse the formatted trackers for a day instead of fetching on every
+        # start, and keep a stale copy around in case the fetch fails
+        trackers_path = cache_path / "trackers.txt"
+        trackers: Optional[str] = None
+        fresh = False
+        if await trackers_path.is_file():
+            age = util.time.sec() - (await trackers_path.stat()).st_mtime
+            trackers = await trackers_path.read_text()
+            fresh = age < 24 * 60 * 60
+
+        if not (trackers and fresh):
+            link = "https://raw.githubusercontent.com/ngosang/trackerslist/master/trackers_best.txt"
+            trackers_list = ""
+            try:
+                async with self.bot.http.get(link) as resp:
+                    if resp.status == 200:
+                        trackers_list = (await resp.text()).strip()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.log.warning("Failed to fetch trackers list", exc_info=e)
+
+            if trackers_list:
+                trackers = "[" + trackers_list.replace("\n\n", ",") + "]"
+                await cache_path.mkdir(parents=True, exist_ok=True)
+                await trackers_path.write_text(trackers)
+            elif trackers:
+                self.log.warning("Using stale trackers list from cache")
 
         cmd = [
             "aria2c", f"--dir={str(download_path)}", "--enable-rpc",
@@ -94,10 +210,12 @@ class Aria2WebSocketServer:
             "--rpc-max-request-size=1024M", "--seed-time=0.01",
             "--seed-ratio=0.1", "--max-concurrent-downloads=5",
             "--min-split-size=10M", "--follow-torrent=mem", "--split=10",
-            "--bt-save-metadata=true", f"--bt-tracker={trackers}",
-            "--daemon=true", "--allow-overwrite=true"
+            "--bt-save-metadata=true", "--daemon=true",
+            "--allow-overwrite=true"
         ]
-        key_path = AsyncPath(Path.home() / ".cache" / "bot" / ".certs")
+        if trackers:
+            cmd.append(f"--bt-tracker={trackers}")
+        key_path = cache_path / ".certs"
         if await (key_path / "cert.pem"
                   ).is_file() and await (key_path / "key.pem").is_file():
             cmd.insert(4, "--rpc-listen-port=8443")
@@ -109,6 +227,19 @@ class Aria2WebSocketServer:
             cmd.insert(4, "--rpc-listen-port=8100")
             self._protocol = "http://127.0.0.1:8100/jsonrpc"
 
+        # taskset would start fine and only fail to exec a missing aria2c,
+        # so check it here to keep the not installed error from Popen
+        if shutil.which("aria2c") is None:
+            raise FileNotFoundError("aria2c")
+
+        # Keep the first CPU free for the bot so aria2 doesn't compete
+        # with the event loop, busybox taskset only understands a hex mask
+        if hasattr(os, "sched_getaffinity") and shutil.which("taskset"):
+            cpus = sorted(os.sched_getaffinity(0))
+            if len(cpus) > 1:
+                mask = sum(1 << cpu for cpu in cpus[1:])
+                cmd = ["taskset", format(mask, "x")] + cmd
+
         server = AsyncAria2Server(*cmd, daemon=True)
         await server.start()
         await server.wait()
@@ -117,10 +248,14 @@ class Aria2WebSocketServer:
 
     async def start(self) -> Aria2WebsocketClient:
         client = await Aria2WebsocketClient.new(url=self._protocol)
+        self.client = client
 
         trigger = [(self.onDownloadStart, "onDownloadStart"),
                    (self.onDownloadComplete, "onDownloadComplete"),
-                   (self.onDownloadError, "onDownloadError")]
+                   (self.onDownloadError, "onDownloadError"),
+                   (self.onDownloadNotify, "onDownloadPause"),
+                   (self.onDownloadNotify, "onDownloadStop"),
+                   (self.onDownloadNotify, "onBtDownloadComplete")]
         for handler, name in trigger:
             client.register(handler, f"aria2.{name}")
 
@@ -144,74 +279,109 @@ class Aria2WebSocketServer:
     async def onDownloadStart(self, client: Aria2WebsocketClient,
                               data: Union[Dict[str, Any], Any]) -> None:
         gid = data["params"][0]["gid"]
-        async with self.lock:
-            self.downloads[gid] = await self.getDownload(client, gid)
+        file = await self.getDownload(client, gid)
+        async with self._meta_lock:
+            self.downloads[gid] = file
+        self.wake.set()
         self.log.info(f"Starting download: [gid: '{gid}']")
 
     async def onDownloadComplete(self, client: Aria2WebsocketClient,
                                  data: Union[Dict[str, Any], Any]) -> None:
         gid = data["params"][0]["gid"]
 
-        async with self.lock:
-            self.downloads[gid] = await self.getDownload(client, gid)
-            file = self.downloads[gid]
-            if file.metadata is True:
-                del self.downloads[gid]
-                self.log.info(f"Complete download: [gid: '{gid}'] - Metadata")
-                return
+        file = await self.getDownload(client, gid)
+        if file.metadata is True:
+            async with self._meta_lock:
+                self.downloads.pop(gid, None)
+            self._gid_locks.pop(gid, None)
+            self.log.info(f"Complete download: [gid: '{gid}'] - Metadata")
+            return
 
-        if await file.is_file():
-            if gid in self.mega:
-                async with self.lock:
-                    del self.downloads[gid]
+        async with self._meta_lock:
+            self.downloads[gid] = file
 
+        kind = await file.kind()
+        if kind == "file":
+            if gid in self.mega:
+                # Stay in downloads so checkProgress renders the decrypt
+                # progress; an abort meanwhile drops it and startUpload skips
                 M: "Mega" = self.bot.plugins["Mega"]  # type: ignore
-                outputFile: AsyncPath = M.file[gid]["file"]
-                aes = M.file[gid]["aes"]
-                CHUNK_SIZE = 50 * 1024 * 1024
+                entry = M.file[gid]
 
                 self.log.info(f"Decrypting download: [gid: '{gid}']")
-                async with AIOFile(outputFile, "w+b") as f:
-                    writer = Writer(f)
-                    async with AIOFile(file.path, "rb") as temp:
-                        reader = Reader(temp, chunk_size=CHUNK_SIZE)
-                        async for chunk in reader:
-                            chunk = await util.run_sync(aes.decrypt, chunk)
-                            await writer(chunk)
-                            await f.fsync()
-                await file.path.unlink()
-                outputFile = await outputFile.rename(outputFile.parent / outputFile.stem)
-                async with self.lock:
-                    self.mega.remove(gid)
-                    self.downloads[gid] = await file.update()
-                    self.uploads[gid] = await self.drive.uploadFile(self.downloads[gid])
-            else:
-                async with self.lock:
-                    self.uploads[gid] = await self.drive.uploadFile(file)
-        elif await file.is_dir():
+                try:
+                    await util.run_sync(_decrypt_file, str(file.path),
+                                        entry["aes"].decrypt,
+                                        lambda done: entry.update(decrypted=done))
+                except OSError as e:
+                    # The file is decrypted in place, so what is left on disk
+                    # is partly plaintext and can't be decrypted again
+                    self.log.error(f"Error on decrypting download: [gid: '{gid}']",
+                                   exc_info=e)
+                    async with self._meta_lock:
+                        self.downloads.pop(gid, None)
+                        self.mega.discard(gid)
+                    self._gid_locks.pop(gid, None)
+
+                    async with self.lock:
+                        if self.context is not None:
+                            await self.bot.respond(self.context.msg,
+                                                   f"`{file.name}`\n"
+                                                   f"Status: **Decrypt failed**\n"
+                                                   f"Error: __{e}__",
+                                                   mode="reply")
+                        await self.checkDelete()
+                    return
+
+                await file.update()
+                async with self._meta_lock:
+                    self.mega.discard(gid)
+
+            await self.startUpload(file)
+        elif kind == "dir":
             folderId = await self.drive.createFolder(file.name)
-            folderTasks = self.drive.uploadFolder(file.dir / file.name,
-                                                  gid=gid,
-                                                  parent_id=folderId)
 
-            async with self.lock:
-                self.uploads[gid] = {"generator": folderTasks, "counter": 0}
+            # Same check as startUpload, an abort may have run meanwhile
+            async with self._gid_locks[gid]:
+                aborted = gid not in self.downloads
+                if not aborted:
+                    folderTasks = self.drive.uploadFolder(file.dir / file.name,
+                                                          gid=gid,
+                                                          parent_id=folderId)
+                    async with self._meta_lock:
+                        self.uploads[gid] = {"generator": folderTasks,
+                                             "counter": 0}
+            if aborted:
+                self._gid_locks.pop(gid, None)
+                return
 
             cancelled = False
             async for task in folderTasks:
+                if gid not in self.uploads:  # Aborted while fetching the next file
+                    task.cancel()
+                    await folderTasks.aclose()
+                    cancelled = True
+                    break
+
+                self._upload_tasks[gid] = task
                 try:
                     await task
                 except asyncio.CancelledError:
                     cancelled = True
                     break
                 else:
-                    async with self.lock:
-                        self.uploads[gid]["counter"] += 1
+                    async with self._meta_lock:
+                        if gid in self.uploads:
+                            self.uploads[gid]["counter"] += 1
+            self._upload_tasks.pop(gid, None)
+            if gid not in self.uploads:  # Aborted after the last file
+                cancelled = True
 
             if not cancelled:
-                async with self.lock:
+                async with self._meta_lock:
                     del self.uploads[gid]
                     del self.downloads[gid]
+                self._gid_locks.pop(gid, None)
 
                 folderLink = (
                     f"**GoogleDrive folderLink**: [{file.name}]"
@@ -232,8 +402,9 @@ class Aria2WebSocketServer:
                         await self.context.respond(folderLink,
                                                    mode="reply")
         else:
-            async with self.lock:
+            async with self._meta_lock:
                 del self.downloads[gid]
+            self._gid_locks.pop(gid, None)
             self.log.warning(f"Can't upload '{file.name}', "
                              f"due to '{file.dir}' is not accessible")
 
@@ -256,56 +427,148 @@ class Aria2WebSocketServer:
                                mode="reply")
 
         self.log.warning(f"[gid: '{gid}']: {file.error_message}")
-        async with self.lock:
+        async with self._meta_lock:
             del self.downloads[file.gid]
+        self._gid_locks.pop(gid, None)
+        async with self.lock:
             await self.checkDelete()
 
+    async def onDownloadNotify(self, client: Aria2WebsocketClient,  # skipcq: PYL-W0613
+                               data: Union[Dict[str, Any], Any]) -> None:
+        self.wake.set()
+
+    async def startUpload(self, file: util.aria2.Download) -> None:
+        gid = file.gid
+
+        # Only this gid waits while Drive creates the upload
+        upload = None
+        async with self._gid_locks[gid]:
+            if gid in self.downloads:
+                upload = await self.drive.uploadFile(file)
+                async with self._meta_lock:
+                    if isinstance(upload, str):  # Size is 0, already uploaded
+                        del self.downloads[gid]
+                    else:
+                        self.uploads[gid] = upload
+                        self._upload_tasks[gid] = self.bot.loop.create_task(
+                            self.pumpUpload(gid, upload))
+        if upload is None or isinstance(upload, str):
+            self._gid_locks.pop(gid, None)
+        if upload is None:  # Aborted before upload started
+            return
+
+        if isinstance(upload, str):
+            mirrorLink = f"https://drive.google.com/uc?id={upload}&export=download"
+            fileLink = (f"**GoogleDrive Link**: [{file.name}]({mirrorLink}) "
+                        f"(__{human(0)}__)")
+            if self.index_link is not None:
+                link = join(self.index_link, parse.quote(file.name))
+                fileLink += f"\n\n__IndexLink__: [Here]({link})."
+
+            async with self.lock:
+                if self.context is not None:
+                    await self.bot.respond(self.context.msg, fileLink,
+                                           mode="reply")
+                await self.checkDelete()
+            return
+
+        self.wake.set()
+
+    async def abortDownload(self, gid: str) -> None:
+        response = None
+
+        # Only pop the state under the locks, the Telegram call below
+        # can be slow and would hold up every other handler
+        async with self._gid_locks[gid]:
+            async with self._meta_lock:
+                file = self.downloads.pop(gid, None)
+                upload = self.uploads.pop(gid, None)
+                task = self._upload_tasks.pop(gid, None)
+                self._upload_chunks.pop(gid, None)
+        self._gid_locks.pop(gid, None)
+
+        # Stop the upload before anything else is awaited, otherwise the
+        # folder loop can resume and step into the generator again
+        if task is not None:
+            task.cancel()
+        if isinstance(upload, dict):
+            try:
+                await upload["generator"].aclose()
+            except RuntimeError:
+                # Generator is busy fetching the next file, the folder
+                # loop closes it once it sees the gid is gone
+                pass
+
+        if file is not None:
+            self.log.info(f"Aborted download: [gid: '{gid}']")
+        if isinstance(upload, dict):
+            self.log.info(f"Aborted upload folder: [gid: '{gid}']")
+        elif upload is not None:
+            self.log.info(f"Aborted upload file: [gid: '{gid}']")
+
+        async with self.lock:
+            if (self.count == 0 and self.context is not None and
+                    self.context.response is not None):
+                response = self.context.response
+                self.context = None  # type: ignore
+
+        if response is not None:
+            await response.delete()
+
     @retry(wait=wait_random_exponential(multiplier=2, min=3, max=6),
            stop=stop_after_attempt(5),
            retry=retry_if_exception_type(KeyError))
     async def checkProgress(self) -> str:
-        progress_string = ""
-        time = util.time.format_duration_td
-        human = util.file.human_readable_bytes
+        progress: List[str] = []
 
-        for file in list(self.downloads.values()):
-            try:
-                file = await file.update()
-            except Aria2rpcException:
+        files = tuple(self.downloads.values())
+        if not files:
+            return ""
+
+        try:
+            statuses = await util.aria2.tell_status_batch(
+                self.client, [file.gid for file in files])
+        except Aria2rpcException:
+            return ""
+
+        for file, status in zip(files, statuses):
+            if status is None:
                 continue
+            file.update_data(status)
 
             if (file.failed or file.paused or
                 (file.complete and file.metadata) or file.removed):
                 continue
 
             if file.complete and not file.metadata:
-                if await file.is_dir():
+                kind = await file.kind()
+                if kind == "dir":
                     counter = self.uploads[file.gid]["counter"]
                     length = len(file.files)
                     percent = round(((counter / length) * 100), 2)
-                    progress_string += (
+                    progress.append(
                         f"`{file.name}`\nGID: `{file.gid}`\n"
                         f"__ComputingFolder: [{counter}/{length}] "
                         f"{percent}%__\n\n")
-                elif await file.is_file():
+                elif kind == "file":
                     if file.gid in self.mega:
                         M: "Mega" = self.bot.plugins["Mega"]  # type: ignore
-                        tempFile = M.file[file.gid]["file"]
 
                         fileSize = file.total_length
-                        decrypted = await (tempFile.stat()).st_size
-                        percent = round(((decrypted / fileSize) * 100))
-                        progress_string += (
+                        decrypted = M.file[file.gid]["decrypted"]
+                        percent = (round(((decrypted / fileSize) * 100))
+                                   if fileSize else 100)
+                        progress.append(
                             f"`{file.name}`\nGID: `{file.gid}`\n"
-                            f"Status: **Decrypting"
-                            f"__{human(decrypted)} of {human(fileSize)}"
+                            f"Status: **Decrypting**\n"
+                            f"__{human(decrypted)} of {human(fileSize)} "
                             f"{percent}%__\n\n")
                         continue
 
                     f = self.uploads[file.gid]
-                    progress, done = await self.uploadProgress(f)
-                    if not done:
-                        progress_string += progress
+                    upload, done = await self.uploadProgress(f)
+                    if not done and upload is not None:
+                        progress.append(upload)
 
                 continue
 
@@ -314,45 +577,19 @@ class Aria2WebSocketServer:
             percent = file.progress
             speed = file.download_speed
             eta = file.eta_formatted
-            bullets = "●" * int(round(percent * 10)) + "○"
-            if len(bullets) > 10:
-                bullets = bullets.replace("○", "")
-
-            space = '    ' * (10 - len(bullets))
-            progress_string += (
+            bars = _BARS[min(int(round(percent * 10)), 10)]
+            progress.append(
                 f"`{file.name}`\nGID: `{file.gid}`\n"
                 f"Status: **{file.status.capitalize()}**\n"
-                f"Progress: [{bullets + space}] {round(percent * 100)}%\n"
+                f"Progress: [{bars}] {round(percent * 100)}%\n"
                 f"__{human(downloaded)} of {human(file_size)} @ "  # type: ignore
                 f"{human(speed, postfix='/s')}\neta - {time(eta)}__\n\n")
 
-        return progress_string
+        return "".join(progress)
 
     async def updateProgress(self) -> None:
         last_update_time = None
         while not self.stopping:
-            for gid in self.cancelled.copy():
-                async with self.lock:
-                    file = None
-                    if gid in self.downloads:
-                        file = self.downloads[gid]
-                        del self.downloads[gid]
-                        self.log.info(f"Aborted download: [gid: '{gid}']")
-                    if (file is not None and await file.is_file() and
-                            gid in self.uploads):
-                        del self.uploads[gid]
-                        self.log.info(f"Aborted upload file: [gid: '{gid}']")
-                    elif (file is not None and await file.is_dir() and
-                            gid in self.uploads):
-                        for task in asyncio.all_tasks():
-                            if task.get_name() == gid:
-                                task.cancel()
-                        await self.uploads[gid]["generator"].aclose()
-                        del self.uploads[gid]
-                        self.log.info(f"Aborted upload folder: [gid: '{gid}']")
-                    self.cancelled.remove(gid)
-                    await self.checkDelete()
-
             try:
                 progress = await self.checkProgress()
             except HttpError as e:
@@ -374,15 +611,71 @@ class Aria2WebSocketServer:
                 finally:
                     last_update_time = now
 
-            await asyncio.sleep(0.1)
+            # The message is only edited every 5 seconds, so tick at that
+            # rate and let download events and cancels wake us up early
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=5.0)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+
+    async def pumpUpload(self, gid: str, file: MediaFileUpload) -> None:
+        failures = 0
+        response = None
+        while response is None:
+            try:
+                status, response = await util.run_sync(file.next_chunk,  # type: ignore
+                                                       num_retries=5)
+            except (HttpError, OSError) as e:
+                failures += 1
+                # Client errors other than rate limits won't go away on retry
+                if (isinstance(e, HttpError) and 400 <= e.resp.status < 500 and
+                        e.resp.status != 429):
+                    failures = UPLOAD_RETRIES
+                self.log.error(f"Error on uploading chunk: [gid: '{gid}'] "
+                               f"({failures}/{UPLOAD_RETRIES})", exc_info=e)
+                if failures >= UPLOAD_RETRIES:
+                    await self.failUpload(gid, file, e)
+                    return
+
+                await asyncio.sleep(2 * failures)
+                continue
+            except Exception as e:  # skipcq: PYL-W0703
+                # Not an I/O error, retrying would only hit it again
+                self.log.error(f"Error on uploading chunk: [gid: '{gid}']",
+                               exc_info=e)
+                await self.failUpload(gid, file, e)
+                return
+
+            failures = 0
+            self._upload_chunks[gid] = (status, response)
+
+        self.wake.set()
+
+    async def failUpload(self, gid: str, file: MediaFileUpload,
+                         err: Exception) -> None:
+        async with self._meta_lock:
+            self.uploads.pop(gid, None)
+            self.downloads.pop(gid, None)
+            self._upload_chunks.pop(gid, None)
+            self._upload_tasks.pop(gid, None)
+        self._gid_locks.pop(gid, None)
+
+        async with self.lock:
+            if self.context is not None:
+                await self.bot.respond(self.context.msg,
+                                       f"`{file.name}`\n"  # type: ignore
+                                       f"Status: **Upload failed**\n"
+                                       f"Error: __{err}__",
+                                       mode="reply")
+            await self.checkDelete()
 
     async def uploadProgress(
             self, file: MediaFileUpload) -> Tuple[Union[str, None], bool]:
-        time = util.time.format_duration_td
-        human = util.file.human_readable_bytes
         progress = None
 
-        status, response = await util.run_sync(file.next_chunk, num_retries=5)  # type: ignore
+        # Chunks are sent by pumpUpload, only report its latest result
+        status, response = self._upload_chunks.get(file.gid, (None, None))  # type: ignore
         if status:
             file_size = status.total_size
             end = util.time.sec() - file.start_time  # type: ignore
@@ -390,19 +683,15 @@ class Aria2WebSocketServer:
             percent = uploaded / file_size
             speed = round(uploaded / end, 2)
             eta = timedelta(seconds=int(round((file_size - uploaded) / speed)))
-            bullets = "●" * int(round(percent * 10)) + "○"
-            if len(bullets) > 10:
-                bullets = bullets.replace("○", "")
-
-            space = '    ' * (10 - len(bullets))
+            bars = _BARS[min(int(round(percent * 10)), 10)]
             progress = (
                 f"`{file.name}`\nGID: `{file.gid}`\n"  # type: ignore
                 f"Status: **Uploading**\n"
-                f"Progress: [{bullets + space}] {round(percent * 100)}%\n"
+                f"Progress: [{bars}] {round(percent * 100)}%\n"
                 f"__{human(uploaded)} of {human(file_size)} @ "
                 f"{human(speed, postfix='/s')}\neta - {time(eta)}__\n\n")
 
-        if response is None and progress is not None:
+        if response is None:
             return progress, False
 
         file_size = response.get("size")
@@ -413,10 +702,15 @@ class Aria2WebSocketServer:
             link = join(self.index_link, parse.quote(file.name))  # type: ignore
             fileLink += f"\n\n__IndexLink__: [Here]({link})."
 
-        async with self.lock:
-            await self.bot.respond(self.context.msg, fileLink, mode="reply")
+        async with self._meta_lock:
             del self.uploads[file.gid]  # type: ignore
             del self.downloads[file.gid]  # type: ignore
+            del self._upload_chunks[file.gid]  # type: ignore
+            self._upload_tasks.pop(file.gid, None)  # type: ignore
+        self._gid_locks.pop(file.gid, None)  # type: ignore
+
+        async with self.lock:
+            await self.bot.respond(self.context.msg, fileLink, mode="reply")
             await self.checkDelete()
 
         return None, True
@@ -444,7 +738,7 @@ class Aria2WebSocketServer:
             if transport:
                 transport.close()
 
-        data = bytes(protocol.output)  # type: ignore
+        data = b"".join(protocol.output)  # type: ignore
         return data.decode("ascii").rstrip()
 
 
@@ -479,13 +773,24 @@ class Aria2(plugin.Plugin):
     async def on_stop(self) -> None:
         if hasattr(self, "_ws"):
             self._ws.stopping = True
+            self._ws.wake.set()
             await self.client.shutdown()
             await self.client.close()
             self._ws.context = None  # type: ignore
 
     async def _formatSE(self, err: Exception) -> str:
-        res = await util.run_sync(ast.literal_eval,
-                                  str(err).split(":", 2)[-1].strip())
+        msg = str(err)
+
+        # The error is always a repr'd dict, so the message can be cut
+        # out directly and only fall back to a full parse if that fails.
+        # Escapes (or an escaped quote cutting it short) need the full parse
+        _, sep, rest = msg.partition("'message': ")
+        if sep and rest[:1] in ("'", '"'):
+            message, sep, _ = rest[1:].partition(rest[0])
+            if sep and "\\" not in message:
+                return "__" + message + "__"
+
+        res = ast.literal_eval(msg.split(":", 2)[-1].strip())
         return "__" + res["error"]["message"] + "__"
 
     async def addDownload(
@@ -542,5 +847,6 @@ class Aria2(plugin.Plugin):
         elif status == "complete" and metadata is True:
             return "__GID belongs to finished Metadata, can't be abort.__"
 
-        self._ws.cancelled.add(gid)
+        await self._ws.abortDownload(gid)
+        self._ws.wake.set()
         return ret
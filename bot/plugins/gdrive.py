@@ -3,7 +3,7 @@ import base64
 import json
 import re
 from datetime import datetime, timedelta
-from typing import Any, AsyncIterator, ClassVar, Iterable, List, MutableMapping, Optional, Set, Tuple, Union
+from typing import Any, AsyncGenerator, AsyncIterator, ClassVar, Iterable, List, MutableMapping, Optional, Set, Tuple, Union
 
 import pyrogram
 from aiopath import AsyncPath
@@ -269,7 +269,7 @@ class GoogleDrive(plugin.Plugin):
         gid: Optional[str] = None,
         parent_id: Optional[str] = None,
         msg: Optional[pyrogram.types.Message] = None
-    ) -> AsyncIterator[asyncio.Task]:
+    ) -> AsyncGenerator[asyncio.Task, None]:
         async for content in sourceFolder.iterdir():
             if await content.is_dir():
                 childFolder = await self.createFolder(content.name, parent_id)
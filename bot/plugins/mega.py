@@ -3,9 +3,7 @@ import random
 import re
 from typing import TYPE_CHECKING, Any, ClassVar, MutableMapping, Optional
 
-from aiopath import AsyncPath
 from Crypto.Cipher import AES
-from Crypto.Util import Counter
 
 from .. import command, plugin, util
 from ..util import crypto
@@ -68,10 +66,8 @@ class Mega(plugin.Plugin):
         att = crypto.decrypt_attr(att, k)
 
         kStr = crypto.a32_to_str(k)
-        counter = Counter.new(128, initial_value=((iv[0] << 32) + iv[1]) << 64)
-        aes = AES.new(kStr, AES.MODE_CTR, counter=counter)
-
-        outputFile: AsyncPath = self.bot.config["download_path"] / (att["n"] + ".temp")
+        aes = AES.new(kStr, AES.MODE_CTR, nonce=b"",
+                      initial_value=((iv[0] << 32) + iv[1]) << 64)
 
         aria2: "Aria2" = self.bot.plugins["Aria2"]  # type: ignore
         gid = await aria2.addDownload(file["g"], ctx, mega=True,
@@ -79,4 +75,4 @@ class Mega(plugin.Plugin):
         if not gid:
             return "Invalid response"
 
-        self.file[gid] = {"file": outputFile, "aes": aes}
+        self.file[gid] = {"aes": aes, "decrypted": 0}
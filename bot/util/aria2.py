@@ -19,6 +19,17 @@ def get_free_port():
     return port
 
 
+async def tell_status_batch(client: Aria2WebsocketTrigger,
+                            gids: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """Fetches the status of every gid in one system.multicall request."""
+    calls = [{"methodName": "aria2.tellStatus", "params": [gid]} for gid in gids]
+    res = await client.multicall(calls)
+
+    # Successful calls come back wrapped in a single-entry list,
+    # failed ones as a fault struct
+    return [data[0] if isinstance(data, list) else None for data in res]
+
+
 class BitTorrent:
 
     def __init__(self, data: Dict[str, Any]) -> None:
@@ -96,6 +107,7 @@ class Download:
 
     _bittorrent: Optional[BitTorrent]
     _files: List[File]
+    _kind: Optional[str]
     _name: str
 
     def __init__(self, client: Aria2WebsocketTrigger, data: Dict[str,
@@ -106,6 +118,7 @@ class Download:
         self._name = ""
         self._files: List[File] = []
         self._bittorrent = None
+        self._kind = None
 
     def __str__(self):
         return self.name
@@ -114,19 +127,36 @@ class Download:
         return self.gid == other.gid
 
     async def update(self) -> "Download":
-        self._data = await self.client.tellStatus(self.gid)
+        return self.update_data(await self.client.tellStatus(self.gid))
+
+    def update_data(self, data: Dict[str, Any]) -> "Download":
+        status = self._data.get("status")
+        self._data = data
 
         self._name = ""
         self._files = []
         self._bittorrent = None
+        if self.status != status:
+            self._kind = None
 
         return self
 
+    async def kind(self) -> Optional[str]:
+        """Returns "file" or "dir", caching the answer until the status changes."""
+        if self._kind is None:
+            path = self.dir / self.name
+            if await path.is_file():
+                self._kind = "file"
+            elif await path.is_dir():
+                self._kind = "dir"
+
+        return self._kind
+
     async def is_file(self) -> bool:
-        return await (self.dir / self.name).is_file()
+        return await self.kind() == "file"
 
     async def is_dir(self) -> bool:
-        return await (self.dir / self.name).is_dir()
+        return await self.kind() == "dir"
 
     @property
     def name(self) -> str: